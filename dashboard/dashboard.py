@@ -1,5 +1,10 @@
 import os
+import tempfile
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 import streamlit as st
 import plotly.express as px
 from datetime import datetime
@@ -22,34 +27,222 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Load and prepare data with error handling
-@st.cache_data
-def load_data(dataset_path):
-    if not os.path.exists(dataset_path):
-        st.error(f"Dataset not found at path: {dataset_path}")
-        st.stop()
-        
-    df = pd.read_csv(dataset_path)
+# Columns used by the dashboard; only these are read from the Parquet file
+required_columns = ['order_purchase_timestamp', 'product_category_name', 'price', 'product_id', 'freight_value', 'product_weight_g', 'quantity']
+dashboard_columns = required_columns + ['payment_value']
+
+# Replace NaNs with the column mean in place on the raw array
+def fill_with_mean(values):
+    missing = np.isnan(values)
+    if missing.any():
+        values[missing] = values[~missing].mean()
+    return values
+
+# Parse the raw CSV and apply the dtype coercion and mean imputation
+def prepare_csv(csv_path):
+    df = pd.read_csv(csv_path)
     df['order_purchase_timestamp'] = pd.to_datetime(df['order_purchase_timestamp'], errors='coerce')
-    df['product_category_name'] = df['product_category_name'].fillna('Unknown Category')
+    df['product_category_name'] = df['product_category_name'].fillna('Unknown Category').astype('category')
     
     numeric_columns = ['price', 'freight_value', 'product_weight_g']
     for col in numeric_columns:
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-            df[col] = df[col].fillna(df[col].mean())
+            df[col] = fill_with_mean(pd.to_numeric(df[col], errors='coerce').to_numpy(dtype='float64', copy=True))
     
     if 'quantity' not in df.columns:
         df['quantity'] = 1  
+
+    # float32 is plenty for prices, weights and counts and halves the bytes scanned
+    float32_columns = numeric_columns + ['payment_value', 'quantity']
+    for col in float32_columns:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float32')
     return df
 
+# One-time CSV -> Parquet migration so dtype coercion and mean imputation
+# are paid once instead of on every cold start. The file is written under a
+# temporary name and moved into place, so concurrent sessions or an
+# interrupted write never leave a partial Parquet file behind.
+def convert_to_parquet(csv_path, parquet_path):
+    df = prepare_csv(csv_path)
+    fd, tmp_path = tempfile.mkstemp(suffix='.parquet.tmp', dir=os.path.dirname(parquet_path))
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, engine='pyarrow', index=False)
+        os.replace(tmp_path, parquet_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Read the prepared dataset (optionally only some columns) from the Parquet copy,
+# falling back to the CSV when the Parquet copy cannot be written (read-only directory)
+def read_dataset(dataset_path, columns=None):
+    parquet_path = os.path.splitext(dataset_path)[0] + '.parquet'
+    if not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(dataset_path):
+        try:
+            convert_to_parquet(dataset_path, parquet_path)
+        except OSError:
+            df = prepare_csv(dataset_path)
+            return df if columns is None else df[[col for col in columns if col in df.columns]]
+    if columns is not None:
+        available_columns = pq.read_schema(parquet_path).names
+        columns = [col for col in columns if col in available_columns]
+    return pd.read_parquet(parquet_path, engine='pyarrow', columns=columns)
+
+# Write a DataFrame with Arrow's multithreaded CSV writer
+def write_csv(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Decode categorical (dictionary) columns to plain values, and write timestamps
+    # at second resolution ("2018-01-01 02:48:41") as DataFrame.to_csv did
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            field = pa.field(field.name, field.type.value_type)
+        elif pa.types.is_timestamp(field.type):
+            field = pa.field(field.name, pa.timestamp('s', tz=field.type.tz))
+        fields.append(field)
+    table = table.cast(pa.schema(fields), safe=False)
+    pacsv.write_csv(table, path)
+
+# Row order of the dataset sorted by purchase time (stable, NaT last)
+def purchase_order(df):
+    return np.argsort(df['order_purchase_timestamp'].to_numpy(), kind='stable')
+
+# Load and prepare data with error handling
+@st.cache_data
+def load_data(dataset_path, dataset_mtime):
+    if not os.path.exists(dataset_path):
+        st.error(f"Dataset not found at path: {dataset_path}")
+        st.stop()
+        
+    df = read_dataset(dataset_path, dashboard_columns)
+    if 'product_category_name' in df.columns:
+        df['product_category_name'] = df['product_category_name'].astype('category')
+    if 'order_purchase_timestamp' in df.columns:
+        # Keep rows in purchase order so a date range is a contiguous slice
+        df = df.iloc[purchase_order(df)].reset_index(drop=True)
+        purchase_day = df['order_purchase_timestamp'].values.astype('datetime64[D]')
+        df['_purchase_day'] = purchase_day
+    if 'price' in df.columns and 'payment_value' in df.columns:
+        df['discount'] = df['price'].values - df['payment_value'].values
+
+    # Static sidebar options
+    all_categories = min_date = max_date = None
+    if all(col in df.columns for col in required_columns):
+        all_categories = sorted(df['product_category_name'].cat.categories.tolist())
+        min_date = df['order_purchase_timestamp'].min().date()
+        max_date = df['order_purchase_timestamp'].max().date()
+    return df, all_categories, min_date, max_date
+
+# Week ending on Sunday, the same label resample('W') uses (1970-01-01 was a Thursday)
+def week_ending(purchase_day):
+    purchase_day = purchase_day.astype('datetime64[D]')
+    return purchase_day + (6 - (purchase_day.astype('int64') + 3) % 7)
+
+# Daily sales per category for the weekly chart (~19k rows vs ~118k raw rows),
+# kept out of load_data so helpers reading the raw frame don't unpickle it too
+@st.cache_data
+def load_cube(dataset_path, dataset_mtime):
+    df = load_data(dataset_path, dataset_mtime)[0]
+    # Sum the float32 prices in float64 so totals keep their cents
+    cube = df.astype({'price': 'float64'}).groupby(['_purchase_day', 'product_category_name'], observed=True).agg(
+        price_sum=('price', 'sum')
+    ).reset_index()
+    cube['_week'] = week_ending(cube['_purchase_day'].values)
+    return cube
+
+# Row positions matching the sidebar filters, shared by the raw rows and the cube.
+# Both are sorted by purchase day, so the date range is found by binary search.
+def select_rows(df, date_lo, date_hi, categories):
+    purchase_day = df['_purchase_day'].values
+    lo, hi = np.searchsorted(purchase_day, [np.datetime64(date_lo, 'D'), np.datetime64(date_hi, 'D') + 1])
+
+    # "Select All Categories" needs no category check at all
+    category_values = df['product_category_name']
+    selected = set(categories)
+    if selected.issuperset(category_values.cat.categories):
+        return np.arange(lo, hi)
+
+    # Per-code lookup table; the trailing False catches code -1 (missing)
+    selected_codes = np.append(category_values.cat.categories.isin(selected), False)
+    return lo + selected_codes[category_values.cat.codes.to_numpy()[lo:hi]].nonzero()[0]
+
+# Filtered intermediates are full-length, so they are computed inside the
+# cached chart helpers below rather than cached themselves
+def get_filtered(dataset_path, dataset_mtime, date_lo, date_hi, categories, columns):
+    df = load_data(dataset_path, dataset_mtime)[0]
+    rows = select_rows(df, date_lo, date_hi, categories)
+    return df.iloc[rows, [df.columns.get_loc(col) for col in columns]]
+
+def get_filtered_cube(dataset_path, dataset_mtime, date_lo, date_hi, categories):
+    cube = load_cube(dataset_path, dataset_mtime)
+    return cube.iloc[select_rows(cube, date_lo, date_hi, categories)]
+
+# Cached chart results keyed on the dataset version and the sidebar filters.
+# Every filter combination is a new key, so each cache keeps only the most recent entries.
+@st.cache_data(max_entries=32)
+def get_kpis(dataset_path, dataset_mtime, date_lo, date_hi, categories):
+    filtered_data = get_filtered(dataset_path, dataset_mtime, date_lo, date_hi, categories, ('price', 'quantity', 'product_id'))
+    price = filtered_data['price'].to_numpy()
+    total_sales = price.sum(dtype=np.float64)
+    avg_order_value = total_sales / price.size
+    total_orders = filtered_data['quantity'].to_numpy().sum(dtype=np.float64)
+    unique_products = filtered_data['product_id'].nunique()
+    return total_sales, avg_order_value, total_orders, unique_products
+
+@st.cache_data(max_entries=32)
+def get_top_products(dataset_path, dataset_mtime, date_lo, date_hi, categories):
+    filtered_data = get_filtered(dataset_path, dataset_mtime, date_lo, date_hi, categories, ('product_id', 'product_category_name', 'price'))
+    top_products = filtered_data['price'].astype('float64').groupby(filtered_data['product_id']).sum().nlargest(10).reset_index()
+    category_lookup = filtered_data.drop_duplicates('product_id').set_index('product_id')['product_category_name']
+    top_products['product_category_name'] = top_products['product_id'].map(category_lookup)
+    return top_products
+
+@st.cache_data(max_entries=32)
+def get_weekly_sales(dataset_path, dataset_mtime, date_lo, date_hi, categories):
+    cube = get_filtered_cube(dataset_path, dataset_mtime, date_lo, date_hi, categories)
+    weekly_sales = cube.groupby('_week')['price_sum'].sum()
+    # Weeks without sales are plotted as zero, as resample('W') did
+    weeks = weekly_sales.index.values
+    all_weeks = np.arange(weeks.min(), weeks.max() + np.timedelta64(1, 'W'), np.timedelta64(1, 'W'))
+    weekly_sales = weekly_sales.reindex(pd.Index(all_weeks, name='_week'), fill_value=0).reset_index()
+    return weekly_sales.rename(columns={'_week': 'order_purchase_timestamp', 'price_sum': 'price'})
+
+@st.cache_data(max_entries=32)
+def get_discount_impact(dataset_path, dataset_mtime, date_lo, date_hi, categories):
+    filtered_data = get_filtered(dataset_path, dataset_mtime, date_lo, date_hi, categories, ('price', 'payment_value', 'quantity', 'discount'))
+    has_discount = filtered_data['discount'].values > 0
+
+    sales = filtered_data[['price', 'payment_value', 'quantity']].astype('float64')
+    discount_impact = sales.groupby(has_discount).agg({
+        'price': 'sum',                # Total harga asli
+        'payment_value': 'sum',        # Total pembayaran yang diterima
+        'quantity': 'sum'              # Total kuantitas yang terjual
+    }).sort_index(ascending=False)
+    discount_impact = discount_impact.rename(index={True: 'Dengan Diskon', False: 'Tanpa Diskon'})
+    return discount_impact.rename_axis('discount_status').reset_index()
+
+@st.cache_data(max_entries=32)
+def get_correlation(dataset_path, dataset_mtime, date_lo, date_hi, categories):
+    filtered_data = get_filtered(dataset_path, dataset_mtime, date_lo, date_hi, categories, ('price', 'quantity'))
+    values = filtered_data.to_numpy(dtype=np.float32, copy=False)
+    # A constant column (e.g. quantity defaulting to 1) gives NaN, as DataFrame.corr does
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.corrcoef(values, rowvar=False)[0, 1]
+
+# The scatter only needs a sample; the correlation coefficient uses every row
+@st.cache_data(max_entries=32)
+def get_scatter_sample(dataset_path, dataset_mtime, date_lo, date_hi, categories):
+    filtered_data = get_filtered(dataset_path, dataset_mtime, date_lo, date_hi, categories, ('price', 'quantity'))
+    return filtered_data.sample(n=min(10_000, len(filtered_data)), random_state=0)
+
 # Load dataset
 script_dir = os.path.dirname(os.path.abspath(__file__))
 dataset_path = os.path.join(script_dir, 'main_dataset.csv')
-main_dataset = load_data(dataset_path)
+dataset_mtime = os.path.getmtime(dataset_path) if os.path.exists(dataset_path) else None
+main_dataset, all_categories, min_date, max_date = load_data(dataset_path, dataset_mtime)
 
 # Verify required columns
-required_columns = ['order_purchase_timestamp', 'product_category_name', 'price', 'product_id', 'freight_value', 'product_weight_g', 'quantity']
 missing_columns = [col for col in required_columns if col not in main_dataset.columns]
 if missing_columns:
     st.error(f"Missing required columns in the dataset: {missing_columns}")
@@ -57,8 +250,6 @@ if missing_columns:
 
 # Sidebar filters
 st.sidebar.title("📊 Dashboard Controls")
-min_date = main_dataset['order_purchase_timestamp'].min().date()
-max_date = main_dataset['order_purchase_timestamp'].max().date()
 
 date_range = st.sidebar.date_input(
     "Select Date Range",
@@ -67,7 +258,6 @@ date_range = st.sidebar.date_input(
     max_value=max_date
 )
 
-all_categories = sorted(main_dataset['product_category_name'].unique().tolist())
 if st.sidebar.checkbox("Select All Categories", True):
     selected_categories = all_categories
 else:
@@ -78,54 +268,51 @@ else:
     )
 
 # Apply filters
-filtered_data = main_dataset[
-    (main_dataset['order_purchase_timestamp'].dt.date >= date_range[0]) &
-    (main_dataset['order_purchase_timestamp'].dt.date <= date_range[1]) &
-    (main_dataset['product_category_name'].isin(selected_categories))
-]
+filter_key = (dataset_path, dataset_mtime, date_range[0], date_range[1], tuple(selected_categories))
+filter_rows = select_rows(main_dataset, date_range[0], date_range[1], selected_categories)
 
-if filtered_data.empty:
+if filter_rows.size == 0:
     st.warning("No data available for the selected filters. Please adjust your selection.")
     st.stop()
 
 # Save filtered data for notebook analysis
 if st.sidebar.button("Save Filtered Data for Notebook Analysis"):
-    filtered_data.to_csv("filtered_data_for_notebook.csv", index=False)
+    # Export every column: read the full file and map the filtered positions
+    # (which index the time-sorted frame) back to the file's own row order
+    full_dataset = read_dataset(dataset_path)
+    export_rows = np.sort(purchase_order(full_dataset)[filter_rows])
+    write_csv(full_dataset.iloc[export_rows], "filtered_data_for_notebook.csv")
     st.sidebar.success("Filtered data saved as 'filtered_data_for_notebook.csv'")
 
 # Main dashboard
 st.title("🛍️ E-Commerce Analytics Dashboard")
 
 # KPIs
+total_sales, avg_order_value, total_orders, unique_products = get_kpis(*filter_key)
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_sales = filtered_data['price'].sum()
     st.metric("Total Sales", f"${total_sales:,.2f}")
 
 with col2:
-    avg_order_value = filtered_data['price'].mean()
     st.metric("Average Order Value", f"${avg_order_value:.2f}")
 
 with col3:
-    total_orders = filtered_data['quantity'].sum()
-    st.metric("Total Orders", f"{total_orders:,}")
+    st.metric("Total Orders", f"{total_orders:,.0f}")
 
 with col4:
-    unique_products = filtered_data['product_id'].nunique()
     st.metric("Unique Products", f"{unique_products:,}")
 
 # Pertanyaan 1: Produk dengan Total Penjualan Tertinggi
 st.subheader("🏆 Produk dengan Total Penjualan Tertinggi")
 
-top_products = filtered_data.groupby(['product_id', 'product_category_name'])['price'].sum().nlargest(10).reset_index()
+top_products = get_top_products(*filter_key)
 
 top_products_chart = px.bar(
-    top_products,
-    x='product_category_name',  
-    y='price',
+    x=top_products['product_category_name'].to_numpy(),
+    y=top_products['price'].to_numpy(),
     title="Top 10 Produk dengan Total Penjualan Tertinggi",
-    labels={'price': 'Total Penjualan ($)', 'product_category_name': 'Nama Produk'}, 
+    labels={'y': 'Total Penjualan ($)', 'x': 'Nama Produk'}, 
     template='plotly_white'
 )
 
@@ -134,13 +321,12 @@ st.plotly_chart(top_products_chart, use_container_width=True)
 
 # Pertanyaan 2: Pola Penjualan Berdasarkan Waktu
 st.subheader("📆 Pola Penjualan Mingguan")
-weekly_sales = filtered_data.set_index('order_purchase_timestamp').resample('W')['price'].sum().reset_index()
+weekly_sales = get_weekly_sales(*filter_key)
 weekly_sales_chart = px.line(
-    weekly_sales,
-    x='order_purchase_timestamp',
-    y='price',
+    x=weekly_sales['order_purchase_timestamp'].to_numpy(),
+    y=weekly_sales['price'].to_numpy(),
     title='Tren Penjualan Mingguan',
-    labels={'price': 'Total Penjualan ($)', 'order_purchase_timestamp': 'Tanggal'},
+    labels={'y': 'Total Penjualan ($)', 'x': 'Tanggal'},
     template='plotly_white'
 )
 st.plotly_chart(weekly_sales_chart, use_container_width=True)
@@ -148,17 +334,7 @@ st.plotly_chart(weekly_sales_chart, use_container_width=True)
 # Pertanyaan 3: Pengaruh Diskon atau Promosi terhadap Penjualan
 st.subheader("🎯 Pengaruh Diskon/Promosi terhadap Penjualan")
 
-filtered_data['discount'] = filtered_data['price'] - filtered_data['payment_value']
-
-filtered_data['discount_status'] = filtered_data['discount'].apply(
-    lambda x: 'Dengan Diskon' if x > 0 else 'Tanpa Diskon'
-)
-
-discount_impact = filtered_data.groupby('discount_status').agg({
-    'price': 'sum',                # Total harga asli
-    'payment_value': 'sum',        # Total pembayaran yang diterima
-    'quantity': 'sum'              # Total kuantitas yang terjual
-}).reset_index()
+discount_impact = get_discount_impact(*filter_key)
 
 # Visualisasi Total Penjualan (Asli vs Pembayaran yang Diterima)
 sales_comparison_chart = px.bar(
@@ -180,14 +356,15 @@ st.info(
 
 # Pertanyaan 4: Korelasi antara Harga dan Jumlah Penjualan
 st.subheader("📉 Korelasi Harga Produk dan Jumlah Penjualan")
-price_quantity_corr = filtered_data[['price', 'quantity']].corr().iloc[0, 1]
+price_quantity_corr = get_correlation(*filter_key)
 st.write(f"Koefisien Korelasi antara Harga dan Jumlah Penjualan: {price_quantity_corr:.2f}")
+scatter_data = get_scatter_sample(*filter_key)
 corr_scatter = px.scatter(
-    filtered_data,
-    x='price',
-    y='quantity',
+    x=scatter_data['price'].to_numpy(),
+    y=scatter_data['quantity'].to_numpy(),
     title='Scatter Plot: Harga vs Jumlah Penjualan',
-    labels={'price': 'Harga ($)', 'quantity': 'Jumlah Penjualan'},
+    labels={'x': 'Harga ($)', 'y': 'Jumlah Penjualan'},
+    render_mode='webgl',
     template='plotly_white'
 )
 st.plotly_chart(corr_scatter, use_container_width=True)